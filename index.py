@@ -6,7 +6,10 @@ import csv
 import os
 import re
 import io
-from datetime import datetime
+import functools
+import hashlib
+import sqlite3
+from datetime import datetime, timezone
 import logging
 from flask_cors import CORS
 
@@ -17,6 +20,9 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# Local SQLite store for extraction history
+HISTORY_DB_PATH = os.environ.get('HISTORY_DB_PATH', 'extraction_history.db')
+
 def extract_form_data(form_url):
     """
     Extract questions, points, options, correct answers, user answers, and image URLs from a Google Form score view
@@ -38,9 +44,72 @@ def extract_form_data(form_url):
         logger.error(f"Failed to access the form. Error: {str(e)}")
         return {"error": f"Failed to access the form. Error: {str(e)}"}
 
-    # Parse the page
     soup = BeautifulSoup(response.text, 'html.parser')
 
+    # Skip the parse entirely if the page content hasn't changed since the last extraction
+    content_hash = compute_content_hash(soup)
+    try:
+        cached = load_cached_extraction(form_url, content_hash)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not read extraction history. Error: {str(e)}")
+        cached = None
+    if cached is not None:
+        logger.info("Page content unchanged since last extraction, using stored result")
+        return cached
+
+    results = parse_form_page(soup)
+
+    if 'error' not in results:
+        try:
+            save_extraction(form_url, content_hash, results)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not save extraction history. Error: {str(e)}")
+
+    return results
+
+def find_form_data_json(soup):
+    """
+    Find the raw FB_PUBLIC_LOAD_DATA_ JSON text in the page scripts
+    """
+    for script in soup.find_all('script'):
+        if script.string and "var FB_PUBLIC_LOAD_DATA_" in script.string:
+            json_text = re.search(r'var FB_PUBLIC_LOAD_DATA_ = (.*);', script.string)
+            if json_text:
+                return json_text.group(1)
+    return None
+
+def compute_content_hash(soup):
+    """
+    Hash the parts of the page that parse_form_page reads
+    """
+    # The raw page can't be hashed: Google embeds per-request values (script nonces,
+    # the fbzx token, ...) that change on every fetch. Only the title, the form
+    # definition in FB_PUBLIC_LOAD_DATA_ and the response blocks feed the parse.
+    digest = hashlib.sha256()
+    title_div = soup.find('div', class_='cTDvob')
+    digest.update((title_div.get_text() if title_div else '').encode('utf-8'))
+
+    form_data_json = find_form_data_json(soup)
+    if form_data_json is not None:
+        try:
+            form_data = json.loads(form_data_json)
+            definition = form_data[1] if isinstance(form_data, list) and len(form_data) > 1 else form_data
+            form_data_json = json.dumps(definition, sort_keys=True)
+        except json.JSONDecodeError:
+            pass
+        digest.update(b'\0' + form_data_json.encode('utf-8'))
+
+    for item in soup.find_all('div', class_='Qr7Oae'):
+        digest.update(b'\0' + str(item).encode('utf-8'))
+    return digest.hexdigest()
+
+# Bump when parse_form_page changes so stored results from the old parser are re-parsed
+PARSER_VERSION = 1
+
+def parse_form_page(soup):
+    """
+    Parse a Google Form score view page into the extraction result
+    """
     # Initialize results
     results = {
         'title': "Google Form Responses",
@@ -56,17 +125,14 @@ def extract_form_data(form_url):
 
     # Extract form data from script (for questions and options)
     form_data = None
-    for script in soup.find_all('script'):
-        if script.string and "var FB_PUBLIC_LOAD_DATA_" in script.string:
-            json_text = re.search(r'var FB_PUBLIC_LOAD_DATA_ = (.*);', script.string)
-            if json_text:
-                try:
-                    form_data = json.loads(json_text.group(1))
-                    logger.info("Successfully extracted form data JSON")
-                    break
-                except json.JSONDecodeError as e:
-                    logger.error(f"Error parsing form data: {str(e)}")
-                    return {"error": f"Error parsing form data: {str(e)}"}
+    form_data_json = find_form_data_json(soup)
+    if form_data_json:
+        try:
+            form_data = json.loads(form_data_json)
+            logger.info("Successfully extracted form data JSON")
+        except json.JSONDecodeError as e:
+            logger.error(f"Error parsing form data: {str(e)}")
+            return {"error": f"Error parsing form data: {str(e)}"}
 
     if not form_data:
         logger.error("Could not find form data in the page")
@@ -301,6 +367,293 @@ def create_csv_data(response_data):
     
     return output.getvalue()
 
+HISTORY_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS forms (
+    form_id TEXT PRIMARY KEY,
+    title TEXT
+);
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    form_id TEXT NOT NULL REFERENCES forms(form_id),
+    position INTEGER NOT NULL,
+    definition_hash TEXT NOT NULL,
+    question TEXT NOT NULL,
+    is_section_or_video INTEGER NOT NULL,
+    points_possible TEXT,
+    correct_answer TEXT,
+    options TEXT NOT NULL,
+    image_urls TEXT NOT NULL,
+    UNIQUE (form_id, position, definition_hash)
+);
+CREATE TABLE IF NOT EXISTS extractions (
+    id INTEGER PRIMARY KEY,
+    form_id TEXT NOT NULL REFERENCES forms(form_id),
+    form_url TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    parser_version INTEGER NOT NULL,
+    title TEXT,
+    first_seen_at TEXT NOT NULL,
+    last_seen_at TEXT NOT NULL,
+    UNIQUE (form_url, content_hash, parser_version)
+);
+CREATE TABLE IF NOT EXISTS responses (
+    extraction_id INTEGER NOT NULL REFERENCES extractions(id) ON DELETE CASCADE,
+    question_id INTEGER NOT NULL REFERENCES questions(id),
+    user_answer TEXT,
+    points_received TEXT,
+    is_correct INTEGER,
+    feedback TEXT,
+    PRIMARY KEY (extraction_id, question_id)
+);
+CREATE INDEX IF NOT EXISTS idx_questions_question ON questions(question COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_extractions_form_id ON extractions(form_id, last_seen_at);
+CREATE INDEX IF NOT EXISTS idx_extractions_url_seen ON extractions(form_url, last_seen_at);
+CREATE INDEX IF NOT EXISTS idx_responses_question_correct ON responses(question_id, is_correct);
+'''
+
+# Question fields that come from the page rather than from the respondent
+QUESTION_FIELDS = ('question', 'is_section_or_video', 'points_possible', 'correct_answer', 'options', 'image_urls')
+
+_initialized_history_paths = set()
+
+def get_history_connection():
+    """
+    Open a connection to the extraction history store, creating the schema the first time a path is used
+    """
+    conn = sqlite3.connect(HISTORY_DB_PATH)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA foreign_keys = ON')
+    if HISTORY_DB_PATH not in _initialized_history_paths:
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.executescript(HISTORY_SCHEMA)
+        _initialized_history_paths.add(HISTORY_DB_PATH)
+    return conn
+
+def history_operation(func):
+    """
+    Run func with a history connection as its first argument, recreating the
+    schema once if the DB file was removed or replaced while the app was running
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(2):
+            conn = get_history_connection()
+            try:
+                return func(conn, *args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if attempt or 'no such table' not in str(e):
+                    raise
+                logger.warning(f"History schema missing from {HISTORY_DB_PATH}, recreating it")
+                _initialized_history_paths.discard(HISTORY_DB_PATH)
+            finally:
+                conn.close()
+    return wrapper
+
+def get_form_id(form_url):
+    """
+    Get the Google Form ID from a form URL, falling back to the URL itself
+    """
+    match = re.search(r'/forms/d/(?:e/)?([\w-]+)', form_url)
+    return match.group(1) if match else form_url
+
+def to_history_timestamp(value):
+    """
+    Format a datetime as a UTC ISO timestamp, the form stored in first_seen_at/last_seen_at (naive values are taken as UTC)
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat(timespec='microseconds')
+
+def _to_db_bool(value):
+    return None if value is None else int(bool(value))
+
+def _from_db_bool(value):
+    return None if value is None else bool(value)
+
+def _question_row(question):
+    """
+    Get the stored form of a question's page-level fields and a hash identifying them
+    """
+    row = (
+        question['question'],
+        int(question['is_section_or_video']),
+        question['points_possible'],
+        question['correct_answer'],
+        json.dumps(question['options']),
+        json.dumps(question['image_urls'])
+    )
+    return hashlib.sha256(json.dumps(row).encode('utf-8')).hexdigest(), row
+
+@history_operation
+def save_extraction(conn, form_url, content_hash, results):
+    """
+    Persist an extraction result, with all rows written in a single transaction.
+
+    Every distinct page content of a URL is kept as its own extraction. Saving
+    content that is already stored only marks it as seen again.
+    """
+    form_id = get_form_id(form_url)
+    now = to_history_timestamp(datetime.now(timezone.utc))
+    questions = results['questions']
+
+    with conn:
+        conn.execute('INSERT INTO forms (form_id, title) VALUES (?, ?) ON CONFLICT(form_id) DO NOTHING',
+                     (form_id, results['title']))
+        conn.execute(
+            '''INSERT INTO extractions (form_id, form_url, content_hash, parser_version, title, first_seen_at, last_seen_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(form_url, content_hash, parser_version) DO UPDATE SET last_seen_at = excluded.last_seen_at''',
+            (form_id, form_url, content_hash, PARSER_VERSION, results['title'], now, now)
+        )
+        extraction_id = conn.execute(
+            'SELECT id FROM extractions WHERE form_url = ? AND content_hash = ? AND parser_version = ?',
+            (form_url, content_hash, PARSER_VERSION)
+        ).fetchone()['id']
+        if conn.execute('SELECT 1 FROM responses WHERE extraction_id = ? LIMIT 1', (extraction_id,)).fetchone():
+            logger.info(f"Extraction of {form_url} with this content is already stored")
+            return
+
+        conn.execute('UPDATE forms SET title = ? WHERE form_id = ?', (results['title'], form_id))
+
+        # Respondents who were shown the same question share one questions row; a
+        # page that shows it differently (edited form, HTML overrides) gets its own
+        question_rows = [_question_row(q) for q in questions]
+        conn.executemany(
+            '''INSERT INTO questions (form_id, position, definition_hash, question, is_section_or_video,
+                                      points_possible, correct_answer, options, image_urls)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(form_id, position, definition_hash) DO NOTHING''',
+            [(form_id, position, definition_hash, *row)
+             for position, (definition_hash, row) in enumerate(question_rows, start=1)]
+        )
+        question_ids = {
+            (row['position'], row['definition_hash']): row['id']
+            for row in conn.execute('SELECT id, position, definition_hash FROM questions WHERE form_id = ?', (form_id,))
+        }
+
+        conn.executemany(
+            '''INSERT INTO responses (extraction_id, question_id, user_answer, points_received, is_correct, feedback)
+               VALUES (?, ?, ?, ?, ?, ?)''',
+            [
+                (extraction_id, question_ids[(position, definition_hash)], q['user_answer'], q['points_received'],
+                 _to_db_bool(q['is_correct']), q['feedback'])
+                for position, (q, (definition_hash, _)) in enumerate(zip(questions, question_rows), start=1)
+            ]
+        )
+    logger.info(f"Saved extraction {extraction_id} for form {form_id} with {len(questions)} questions")
+
+@history_operation
+def load_cached_extraction(conn, form_url, content_hash):
+    """
+    Rebuild a stored extraction result if this URL was already extracted with the
+    same page content and parser version, and mark it as seen again
+    """
+    with conn:
+        extraction = conn.execute(
+            'SELECT id, title FROM extractions WHERE form_url = ? AND content_hash = ? AND parser_version = ?',
+            (form_url, content_hash, PARSER_VERSION)
+        ).fetchone()
+        if extraction is None:
+            return None
+        conn.execute('UPDATE extractions SET last_seen_at = ? WHERE id = ?',
+                     (to_history_timestamp(datetime.now(timezone.utc)), extraction['id']))
+
+    rows = conn.execute(
+        f'''SELECT {', '.join('q.' + field for field in QUESTION_FIELDS)},
+                   r.user_answer, r.points_received, r.is_correct, r.feedback
+            FROM responses r JOIN questions q ON q.id = r.question_id
+            WHERE r.extraction_id = ?
+            ORDER BY q.position''',
+        (extraction['id'],)
+    ).fetchall()
+
+    return {
+        'title': extraction['title'],
+        'questions': [
+            {
+                'question': row['question'],
+                'is_section_or_video': bool(row['is_section_or_video']),
+                'points_possible': row['points_possible'],
+                'options': json.loads(row['options']),
+                'correct_answer': row['correct_answer'],
+                'user_answer': row['user_answer'],
+                'points_received': row['points_received'],
+                'is_correct': _from_db_bool(row['is_correct']),
+                'image_urls': json.loads(row['image_urls']),
+                'feedback': row['feedback']
+            }
+            for row in rows
+        ]
+    }
+
+@history_operation
+def query_responses(conn, form_id=None, question=None, position=None, is_correct=None,
+                    since=None, until=None, latest_only=False, limit=1000):
+    """
+    Query stored responses, e.g. everyone who got a given question wrong since a given date.
+
+    question is a case-insensitive prefix of the question text. since/until are
+    datetimes; an extraction matches if it was seen at any point in that window,
+    i.e. first seen before until and last seen at or after since. latest_only keeps
+    only the most recently seen extraction of each form URL.
+    """
+    clauses = ['q.is_section_or_video = 0']
+    params = []
+    if form_id is not None:
+        clauses.append('e.form_id = ?')
+        params.append(form_id)
+    if question is not None:
+        clauses.append("q.question LIKE ? ESCAPE '\\'")
+        params.append(re.sub(r'([\\%_])', r'\\\1', question) + '%')
+    if position is not None:
+        clauses.append('q.position = ?')
+        params.append(position)
+    if is_correct is not None:
+        clauses.append('r.is_correct = ?')
+        params.append(_to_db_bool(is_correct))
+    if since is not None:
+        clauses.append('e.last_seen_at >= ?')
+        params.append(to_history_timestamp(since))
+    if until is not None:
+        clauses.append('e.first_seen_at < ?')
+        params.append(to_history_timestamp(until))
+    if latest_only:
+        clauses.append('''e.id = (SELECT id FROM extractions WHERE form_url = e.form_url
+                                  ORDER BY last_seen_at DESC, id DESC LIMIT 1)''')
+    params.append(max(1, limit))
+
+    rows = conn.execute(
+        f'''SELECT e.form_id, e.title, e.form_url, e.first_seen_at, e.last_seen_at, q.position, q.question,
+                   q.correct_answer, r.user_answer, r.points_received, q.points_possible, r.is_correct
+            FROM responses r
+            JOIN questions q ON q.id = r.question_id
+            JOIN extractions e ON e.id = r.extraction_id
+            WHERE {' AND '.join(clauses)}
+            ORDER BY e.last_seen_at DESC, q.position
+            LIMIT ?''',
+        params
+    ).fetchall()
+
+    results = []
+    for row in rows:
+        item = dict(row)
+        item['is_correct'] = _from_db_bool(item['is_correct'])
+        results.append(item)
+    return results
+
+@history_operation
+def list_forms(conn):
+    """
+    List the forms in the history store with their current title and extraction counts
+    """
+    rows = conn.execute(
+        '''SELECT f.form_id, f.title, COUNT(e.id) AS extractions, MAX(e.last_seen_at) AS last_seen_at
+           FROM forms f LEFT JOIN extractions e ON e.form_id = f.form_id
+           GROUP BY f.form_id
+           ORDER BY last_seen_at DESC'''
+    ).fetchall()
+    return [dict(row) for row in rows]
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -352,6 +705,63 @@ def download_csv():
         logger.error(f"Error creating CSV: {str(e)}")
         return jsonify({'error': f'CSV creation failed: {str(e)}'}), 500
 
+@app.route('/api/history/responses', methods=['GET'])
+def history_responses():
+    args = request.args
+    flags = {}
+    for name in ('is_correct', 'latest_only'):
+        value = args.get(name)
+        if value is not None:
+            if value.lower() not in ('true', 'false'):
+                return jsonify({'error': f'{name} must be true or false'}), 400
+            value = value.lower() == 'true'
+        flags[name] = value
+
+    numbers = {'position': None, 'limit': 1000}
+    for name in numbers:
+        value = args.get(name)
+        if value is not None:
+            try:
+                numbers[name] = int(value)
+            except ValueError:
+                return jsonify({'error': f'{name} must be an integer'}), 400
+    limit = min(max(numbers['limit'], 1), 1000)
+
+    dates = {}
+    for name in ('since', 'until'):
+        value = args.get(name)
+        if value is not None:
+            try:
+                value = datetime.fromisoformat(value)
+            except ValueError:
+                return jsonify({'error': f'{name} must be an ISO 8601 date or datetime'}), 400
+        dates[name] = value
+
+    try:
+        rows = query_responses(
+            form_id=args.get('form_id'),
+            question=args.get('question'),
+            position=numbers['position'],
+            is_correct=flags['is_correct'],
+            since=dates['since'],
+            until=dates['until'],
+            latest_only=bool(flags['latest_only']),
+            limit=limit
+        )
+        return jsonify({'responses': rows, 'count': len(rows)})
+    except sqlite3.Error as e:
+        logger.error(f"Error querying history: {str(e)}")
+        return jsonify({'error': f'History query failed: {str(e)}'}), 500
+
+@app.route('/api/history/forms', methods=['GET'])
+def history_forms():
+    try:
+        forms = list_forms()
+        return jsonify({'forms': forms, 'count': len(forms)})
+    except sqlite3.Error as e:
+        logger.error(f"Error querying history: {str(e)}")
+        return jsonify({'error': f'History query failed: {str(e)}'}), 500
+
 if __name__ == '__main__':
     # Create templates directory if it doesn't exist
     os.makedirs('templates', exist_ok=True)
@@ -0,0 +1,258 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bs4 import BeautifulSoup
+
+import index
+
+FORM_URL = 'https://docs.google.com/forms/d/e/FORM1/viewscore?sid={sid}'
+
+
+def make_page(questions, nonce='n1'):
+    """
+    Build a minimal score view page. questions is a list of
+    (text, json_points, user_answer, html_points, correct) tuples.
+    """
+    items = [
+        [i, text, None, points, [[i * 10, [['Paris'], ['Rome']], 0, 1]]]
+        for i, (text, points, _, _, _) in enumerate(questions, start=1)
+    ]
+    # The trailing value stands in for the per-request fbzx token
+    form_data = [None, ['description', items], '/forms', f'fbzx-{nonce}']
+    blocks = ''.join(
+        f'<div class="Qr7Oae"><span class="M7eMe">{text}</span>'
+        f'<input jsname="L9xHkb" value="{answer}">'
+        f'<div class="RGoode">{html_points}</div>'
+        f'<div class="zS667" aria-label="{"सही" if correct else "गलत"}"></div></div>'
+        for text, _, answer, html_points, correct in questions
+    )
+    return (
+        f'<html><body><div class="cTDvob">Geography quiz</div>'
+        f'<script nonce="{nonce}">var FB_PUBLIC_LOAD_DATA_ = {json.dumps(form_data)};</script>'
+        f'{blocks}</body></html>'
+    )
+
+
+SID1_PAGE = [
+    ('Largest ocean?', 1, 'Pacific', '1/1', True),
+    ('Capital?', 1, 'Rome', '0/1', False),
+]
+SID2_PAGE = [
+    ('Largest ocean?', 1, 'Atlantic', '0/1', False),
+    ('Capital city?', 1, 'Paris', '5/5', True),
+]
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def pages(monkeypatch, tmp_path):
+    monkeypatch.setattr(index, 'HISTORY_DB_PATH', str(tmp_path / 'history.db'))
+    served = {}
+    monkeypatch.setattr(index.requests.Session, 'get', lambda self, url: FakeResponse(served[url]))
+    return served
+
+
+@pytest.fixture
+def parse_calls(monkeypatch):
+    calls = []
+    parse = index.parse_form_page
+
+    def counting_parse(soup):
+        calls.append(soup)
+        return parse(soup)
+
+    monkeypatch.setattr(index, 'parse_form_page', counting_parse)
+    return calls
+
+
+def parse(html):
+    return index.parse_form_page(BeautifulSoup(html, 'html.parser'))
+
+
+def test_save_load_round_trip(pages):
+    html = make_page(SID1_PAGE)
+    parsed = parse(html)
+    content_hash = index.compute_content_hash(BeautifulSoup(html, 'html.parser'))
+
+    index.save_extraction(FORM_URL.format(sid=1), content_hash, parsed)
+
+    assert index.load_cached_extraction(FORM_URL.format(sid=1), content_hash) == parsed
+    assert index.load_cached_extraction(FORM_URL.format(sid=1), 'other') is None
+
+
+def test_unchanged_content_skips_parse(pages, parse_calls):
+    url = FORM_URL.format(sid=1)
+    pages[url] = make_page(SID1_PAGE, nonce='first')
+    first = index.extract_form_data(url)
+
+    # Per-request tokens change, the form and responses don't
+    pages[url] = make_page(SID1_PAGE, nonce='second')
+    second = index.extract_form_data(url)
+
+    assert len(parse_calls) == 1
+    assert second == first
+
+
+def test_respondents_do_not_affect_each_other(pages, parse_calls):
+    url1, url2 = FORM_URL.format(sid=1), FORM_URL.format(sid=2)
+    pages[url1] = make_page(SID1_PAGE)
+    pages[url2] = make_page(SID2_PAGE)
+
+    first = index.extract_form_data(url1)
+    index.extract_form_data(url2)
+    again = index.extract_form_data(url1)
+
+    assert len(parse_calls) == 2
+    assert again == first == parse(pages[url1])
+    assert again['questions'][1]['question'] == 'Capital?'
+    assert again['questions'][1]['points_possible'] == '1'
+
+    rows = index.query_responses(position=2)
+    assert sorted((row['question'], row['points_possible']) for row in rows) == [
+        ('Capital city?', '5'), ('Capital?', '1')
+    ]
+
+
+def test_changed_content_keeps_history(pages):
+    url = FORM_URL.format(sid=1)
+    pages[url] = make_page(SID1_PAGE)
+    index.extract_form_data(url)
+    pages[url] = make_page([SID1_PAGE[0], ('Capital?', 1, 'Paris', '1/1', True)])
+    index.extract_form_data(url)
+
+    rows = index.query_responses(position=2)
+    assert sorted(row['user_answer'] for row in rows) == ['Paris', 'Rome']
+    latest = index.query_responses(position=2, latest_only=True)
+    assert [row['user_answer'] for row in latest] == ['Paris']
+
+
+def test_latest_only_follows_last_seen(pages, parse_calls):
+    url = FORM_URL.format(sid=1)
+    page_a = make_page(SID1_PAGE)
+    page_b = make_page([SID1_PAGE[0], ('Capital?', 1, 'Paris', '1/1', True)])
+
+    for page in (page_a, page_b, page_a):
+        pages[url] = page
+        result = index.extract_form_data(url)
+
+    assert len(parse_calls) == 2
+    assert result['questions'][1]['user_answer'] == 'Rome'
+    latest = index.query_responses(position=2, latest_only=True)
+    assert [row['user_answer'] for row in latest] == ['Rome']
+
+
+def test_date_filters_use_when_extraction_was_seen(pages):
+    url = FORM_URL.format(sid=1)
+    pages[url] = make_page(SID1_PAGE)
+    index.extract_form_data(url)
+    seen_again = datetime.now(timezone.utc)
+    index.extract_form_data(url)
+
+    # Unchanged content re-extracted inside the window still matches
+    assert len(index.query_responses(since=seen_again)) == 2
+    assert index.query_responses(since=datetime.now(timezone.utc) + timedelta(seconds=1)) == []
+    assert index.query_responses(until=datetime(2000, 1, 1)) == []
+
+
+def test_parser_version_change_reparses(pages, parse_calls, monkeypatch):
+    url = FORM_URL.format(sid=1)
+    pages[url] = make_page(SID1_PAGE)
+    index.extract_form_data(url)
+    index.extract_form_data(url)
+    assert len(parse_calls) == 1
+
+    monkeypatch.setattr(index, 'PARSER_VERSION', index.PARSER_VERSION + 1)
+    index.extract_form_data(url)
+    index.extract_form_data(url)
+    assert len(parse_calls) == 2
+
+
+def test_respondents_share_identical_questions(pages):
+    pages[FORM_URL.format(sid=1)] = make_page(SID1_PAGE)
+    pages[FORM_URL.format(sid=2)] = make_page(SID2_PAGE)
+    index.extract_form_data(FORM_URL.format(sid=1))
+    index.extract_form_data(FORM_URL.format(sid=2))
+
+    conn = index.get_history_connection()
+    try:
+        rows = conn.execute('SELECT position, question FROM questions ORDER BY position, question').fetchall()
+    finally:
+        conn.close()
+    assert [tuple(row) for row in rows] == [(1, 'Largest ocean?'), (2, 'Capital city?'), (2, 'Capital?')]
+
+
+def test_schema_recreated_after_db_removed(pages, tmp_path):
+    html = make_page(SID1_PAGE)
+    index.save_extraction(FORM_URL.format(sid=1), 'h1', parse(html))
+    (tmp_path / 'history.db').unlink()
+    for suffix in ('-wal', '-shm'):
+        (tmp_path / f'history.db{suffix}').unlink(missing_ok=True)
+
+    assert index.load_cached_extraction(FORM_URL.format(sid=1), 'h1') is None
+    index.save_extraction(FORM_URL.format(sid=1), 'h1', parse(html))
+    assert index.load_cached_extraction(FORM_URL.format(sid=1), 'h1') is not None
+
+
+@pytest.fixture
+def client(pages):
+    pages[FORM_URL.format(sid=1)] = make_page(SID1_PAGE)
+    pages[FORM_URL.format(sid=2)] = make_page(SID2_PAGE)
+    index.extract_form_data(FORM_URL.format(sid=1))
+    index.extract_form_data(FORM_URL.format(sid=2))
+    return index.app.test_client()
+
+
+def get_rows(client, query):
+    response = client.get(f'/api/history/responses?{query}')
+    assert response.status_code == 200
+    return response.get_json()['responses']
+
+
+def test_history_endpoint_filters(client):
+    assert len(get_rows(client, '')) == 4
+
+    missed = get_rows(client, 'is_correct=false')
+    assert sorted(row['user_answer'] for row in missed) == ['Atlantic', 'Rome']
+
+    second = get_rows(client, 'form_id=FORM1&position=2&is_correct=true')
+    assert [row['question'] for row in second] == ['Capital city?']
+
+    assert len(get_rows(client, 'question=capital')) == 2
+    assert [row['question'] for row in get_rows(client, 'question=Capital%20c')] == ['Capital city?']
+    assert get_rows(client, 'question=%25') == []
+
+    assert len(get_rows(client, 'limit=-1')) == 1
+    assert len(get_rows(client, 'since=2000-01-01&until=2100-01-01T00:00:00%2B00:00')) == 4
+    assert get_rows(client, 'since=2100-01-01') == []
+    assert get_rows(client, 'form_id=OTHER') == []
+
+
+def test_history_forms_endpoint(client):
+    response = client.get('/api/history/forms')
+    assert response.status_code == 200
+    forms = response.get_json()['forms']
+    assert [(form['form_id'], form['title'], form['extractions']) for form in forms] == [
+        ('FORM1', 'Geography quiz', 2)
+    ]
+
+
+@pytest.mark.parametrize('query', [
+    'position=abc',
+    'limit=ten',
+    'is_correct=maybe',
+    'latest_only=1',
+    'since=last-week',
+    'until=2024-13-01',
+])
+def test_history_endpoint_rejects_bad_params(client, query):
+    response = client.get(f'/api/history/responses?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()